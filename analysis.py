@@ -5,10 +5,23 @@ Analysis of candelstick patterns
 # Import libraries
 import pandas as pd
 import numpy as np
+import numba
+import numexpr as ne
+
+try:
+    # Optional GPU backend: with CuPy installed the packed predicate
+    # words are scored against every pattern in one fused kernel launch
+    import cupy as cp
+    if cp.cuda.runtime.getDeviceCount() == 0:
+        cp = None
+except Exception:
+    # Covers CuPy being absent as well as installed without a usable
+    # CUDA driver, in which case even the device count query raises
+    cp = None
 
 from typing import Optional
 from data import read_local_file, check_bad_values, correct_dates
-from data import correct_changes, asym_rolling_minmax, expanding_quantiles
+from data import correct_changes
 from plotting import summary_plot, candlestick_plot, scatter_matrix_plot
 
 # List potential candlestick patterns
@@ -21,6 +34,260 @@ patterns = ["hammer", "inv_hammer",
             "doji", "spinning",
             "falling", "rising"]
 
+# Bit layout of the packed predicate word
+# Every primitive predicate owns one bit at offset 0;
+# predicates that patterns test on earlier candles also own
+# one bit per shifted offset, so a single uint64 per row encodes
+# the state of candles i, i-1, ... i-4
+_pred_names = ["is_green", "is_red",
+               "long_lwick", "long_uwick",
+               "short_lwick", "short_uwick",
+               "tiny_lwick", "tiny_uwick",
+               "equal_wicks", "short_body",
+               "long_body", "tiny_body",
+               "sub25_body", "minimum",
+               "maximum", "close_up",
+               "open_up", "prev_short50",
+               "prev_long50", "prev_short25",
+               "prev2_long50", "engulf_bull",
+               "engulf_bear", "gap_down",
+               "above_mid", "below_mid",
+               "red_open_above", "contain_low",
+               "contain_high", "trend_down",
+               "trend_up"]
+
+_pred_offsets = {1: ["is_green", "is_red",
+                     "short_lwick", "short_uwick",
+                     "tiny_lwick", "tiny_uwick",
+                     "equal_wicks", "tiny_body",
+                     "sub25_body", "close_up", "open_up"],
+                 2: ["is_green", "is_red",
+                     "short_lwick", "short_uwick",
+                     "tiny_lwick", "tiny_uwick"],
+                 3: ["is_green", "is_red"],
+                 4: ["is_green", "is_red"]}
+
+_pred_bits = {(name, 0): bit for bit, name in enumerate(_pred_names)}
+for _offset, _names in _pred_offsets.items():
+    for _name in _names:
+        _pred_bits[(_name, _offset)] = len(_pred_bits)
+
+# The predicates each pattern requires, as (name, candle offset) pairs
+_pattern_predicates = {
+    "hammer": [("long_lwick", 0), ("short_body", 0), ("minimum", 0)],
+    "inv_hammer": [("short_lwick", 0), ("long_uwick", 0), ("minimum", 0)],
+    "bull_engulf": [("is_green", 0), ("is_red", 1),
+                    ("prev_short50", 0), ("engulf_bull", 0)],
+    "piercing": [("is_green", 0), ("is_red", 1),
+                 ("prev_long50", 0), ("long_body", 0),
+                 ("gap_down", 0), ("above_mid", 0)],
+    "morning": [("is_green", 0), ("is_red", 2),
+                ("prev2_long50", 0), ("long_body", 0), ("prev_short25", 0)],
+    "soldiers": [("is_green", 0), ("is_green", 1), ("is_green", 2),
+                 ("short_uwick", 0), ("short_uwick", 1), ("short_uwick", 2),
+                 ("short_lwick", 0), ("short_lwick", 1), ("short_lwick", 2),
+                 ("close_up", 0), ("close_up", 1),
+                 ("open_up", 0), ("open_up", 1)],
+    "hanging": [("long_lwick", 0), ("short_body", 0), ("maximum", 0)],
+    "shooting": [("short_lwick", 0), ("long_uwick", 0),
+                 ("maximum", 0), ("is_red", 0)],
+    "bear_engulf": [("is_red", 0), ("is_green", 1),
+                    ("prev_short50", 0), ("long_body", 0), ("engulf_bear", 0)],
+    "evening": [("is_red", 0), ("is_green", 2),
+                ("prev2_long50", 0), ("long_body", 0), ("prev_short25", 0)],
+    "crows": [("is_red", 0), ("is_red", 1), ("is_red", 2),
+              ("tiny_lwick", 0), ("tiny_lwick", 1), ("tiny_lwick", 2),
+              ("tiny_uwick", 0), ("tiny_uwick", 1), ("tiny_uwick", 2)],
+    "cloud": [("is_green", 1), ("is_red", 0),
+              ("red_open_above", 0), ("below_mid", 0)],
+    "doji": [("tiny_body", 0), ("tiny_body", 1)],
+    "spinning": [("sub25_body", 0), ("sub25_body", 1),
+                 ("equal_wicks", 0), ("equal_wicks", 1)],
+    "falling": [("is_red", 0), ("is_red", 4),
+                ("is_green", 1), ("is_green", 2), ("is_green", 3),
+                ("contain_low", 0), ("contain_high", 0), ("trend_down", 0)],
+    "rising": [("is_green", 0), ("is_green", 4),
+               ("is_red", 1), ("is_red", 2), ("is_red", 3),
+               ("contain_low", 0), ("contain_high", 0), ("trend_up", 0)],
+}
+
+# Each pattern reduces to a single AND+compare against its mask
+PATTERN_MASKS = {pattern: np.uint64(sum(1 << _pred_bits[key] for key in keys))
+                 for pattern, keys in _pattern_predicates.items()}
+
+# Position of each pattern's bit inside the per-row GPU hit word
+_pattern_slots = {pattern: slot for slot, pattern in enumerate(PATTERN_MASKS)}
+
+if cp is not None:
+    # Each thread ANDs its row's packed word against all the pattern masks
+    # and sets one hit bit per match, so a full pattern sweep is a single
+    # launch rather than one AND+compare scan per pattern
+    _score_patterns = cp.ElementwiseKernel(
+        "uint64 packed, raw uint64 masks, int32 n_masks",
+        "uint16 hits",
+        """
+        unsigned short h = 0;
+        for (int k = 0; k < n_masks; k++) {
+            const unsigned long long m = masks[k];
+            if ((packed & m) == m) h |= (unsigned short)(1 << k);
+        }
+        hits = h;
+        """,
+        "score_patterns")
+
+@numba.njit(cache=True)
+def _sift_up(heap, j):
+    """
+    Restore the min-heap property after appending at index j
+    """
+
+    while j > 0:
+        parent = (j - 1) // 2
+        if heap[parent] <= heap[j]:
+            break
+        heap[parent], heap[j] = heap[j], heap[parent]
+        j = parent
+
+@numba.njit(cache=True)
+def _sift_down(heap, size):
+    """
+    Restore the min-heap property after replacing the root
+    """
+
+    j = 0
+    while True:
+        child = 2*j + 1
+        if child >= size:
+            break
+        if child + 1 < size and heap[child + 1] < heap[child]:
+            child += 1
+        if heap[j] <= heap[child]:
+            break
+        heap[j], heap[child] = heap[child], heap[j]
+        j = child
+
+@numba.njit(cache=True)
+def _expanding_quantile(values, q):
+    """
+    Time-consistent expanding quantile, maintained online with two heaps:
+    a max-heap (stored negated) holding the values at or below the quantile
+    and a min-heap holding the rest.
+    Each insertion rebalances in O(log i), giving O(N log N) overall
+    instead of re-sorting the expanding window each row.
+    Interpolation between the heap roots matches pandas' linear method.
+    """
+
+    n = values.shape[0]
+    out = np.empty_like(values)
+    lower = np.empty_like(values)
+    upper = np.empty_like(values)
+    lsize, usize = 0, 0
+
+    for i in range(n):
+        x = values[i]
+        if lsize == 0 or x <= -lower[0]:
+            lower[lsize] = -x
+            _sift_up(lower, lsize)
+            lsize += 1
+        else:
+            upper[usize] = x
+            _sift_up(upper, usize)
+            usize += 1
+
+        # The lower heap holds the samples up to the virtual quantile index
+        pos = q * i
+        target = int(np.floor(pos)) + 1
+        while lsize > target:
+            val = -lower[0]
+            lower[0] = lower[lsize - 1]
+            lsize -= 1
+            _sift_down(lower, lsize)
+            upper[usize] = val
+            _sift_up(upper, usize)
+            usize += 1
+        while lsize < target:
+            val = upper[0]
+            upper[0] = upper[usize - 1]
+            usize -= 1
+            _sift_down(upper, usize)
+            lower[lsize] = -val
+            _sift_up(lower, lsize)
+            lsize += 1
+
+        a = -lower[0]
+        t = pos - np.floor(pos)
+        if usize > 0 and t > 0.0:
+            # Two-sided lerp, as used by NumPy/pandas
+            b = upper[0]
+            if t >= 0.5:
+                out[i] = b - (b - a)*(1.0 - t)
+            else:
+                out[i] = a + (b - a)*t
+        else:
+            out[i] = a
+
+    return out
+
+@numba.njit(cache=True, parallel=True, boundscheck=False)
+def _rolling_extrema(price, look_back, look_forward):
+    """
+    Asymmetrical local minimum and maximum flags in one pass
+    Every window is independent, so the rows are split across cores
+    """
+
+    n = price.shape[0]
+    is_min = np.zeros(n, dtype=np.uint8)
+    is_max = np.zeros(n, dtype=np.uint8)
+    for i in numba.prange(n):
+        start = max(0, i - look_back)
+        end = min(n, i + look_forward + 1)
+        mn = price[start]
+        mx = price[start]
+        for j in range(start + 1, end):
+            if price[j] < mn:
+                mn = price[j]
+            if price[j] > mx:
+                mx = price[j]
+        is_min[i] = price[i] == mn
+        is_max[i] = price[i] == mx
+
+    return is_min, is_max
+
+@numba.njit(cache=True, parallel=True, boundscheck=False)
+def _derive(open_a, price, high, low):
+    """
+    Compute body, lower-wick and upper-wick lengths in one pass
+    """
+
+    n = open_a.shape[0]
+    body = np.empty_like(open_a)
+    lwick = np.empty_like(open_a)
+    uwick = np.empty_like(open_a)
+    for i in numba.prange(n):
+        mn = open_a[i] if open_a[i] < price[i] else price[i]
+        mx = open_a[i] if open_a[i] > price[i] else price[i]
+        body[i] = mx - mn
+        lwick[i] = mn - low[i]
+        uwick[i] = high[i] - mx
+
+    return body, lwick, uwick
+
+# Keep the jitted kernels addressable under stable names so
+# build_kernels.py can reach their .py_func even after the
+# ahead-of-time module below has replaced the public names
+_derive_jit = _derive
+_rolling_extrema_jit = _rolling_extrema
+_expanding_quantile_jit = _expanding_quantile
+
+try:
+    # Prefer the ahead-of-time compiled kernels when they have been built
+    # (see build_kernels.py), so first use pays no JIT compilation cost
+    from quant_kernels import (derive as _derive,
+                               rolling_extrema as _rolling_extrema,
+                               expanding_quantile as _expanding_quantile)
+except ImportError:
+    pass
+
 class Identify:
     """
     OOP identify class
@@ -47,9 +314,24 @@ class Identify:
             correct_changes(df)
             df.sort_values(["Date"], ignore_index=True, inplace=True)
         
-        mask = (df["Date"] >= start_date) & (df["Date"] <= end_date)
-        self.data = df.loc[mask]
+        # The dates are sorted, so the requested range is a contiguous
+        # positional slice: two binary searches instead of a full mask scan,
+        # and the copy guarantees later column assignments are in-place
+        dates = df["Date"].to_numpy()
+        lo = np.searchsorted(dates, np.datetime64(start_date))
+        hi = np.searchsorted(dates, np.datetime64(end_date), side="right")
+        self.data = df.iloc[lo:hi].reset_index(drop=True).copy()
         print("Selected", self.data.shape[0], "entries")
+
+        # Contiguous float32 copies of the OHLC columns;
+        # all derived kernels work on these, halving memory traffic and
+        # doubling SIMD lane throughput, while self.data is kept for
+        # plotting and printing
+        self.open = self.data["Open"].to_numpy(np.float32)
+        self.price = self.data["Price"].to_numpy(np.float32)
+        self.high = self.data["High"].to_numpy(np.float32)
+        self.low = self.data["Low"].to_numpy(np.float32)
+        self.n = self.open.shape[0]
     
     def print_data(self, number: int) -> None:
         """
@@ -74,90 +356,206 @@ class Identify:
         print("Printing scatter matrix plot")
         scatter_matrix_plot(self.data)
     
-    def analyse_pattern(self) -> pd.DataFrame:
+    def _ensure_derived(self) -> None:
         """
         Calculate important derivative data
-        """
-
-        # Calculate body length
-        self.data["Body"] = abs(self.data["Open"] - self.data["Price"])
-        # Calculate lower wick length
-        self.data["L-Wick"] = self.data[["Open", "Price"]].min(axis=1) - self.data["Low"]
-        # Calculate the upper wick length
-        self.data["U-Wick"] = self.data["High"] - self.data[["Open", "Price"]].max(axis=1)
-        # Calculate quantile data of body length
-        self.data = expanding_quantiles(self.data, "Body", [0.05, 0.25, 0.50])
+        Memoized on the identity and length of self.data,
+        so sweeping several patterns only pays for the derivation once
+        """
+
+        version = (id(self.data), self.data.shape[0])
+        if getattr(self, "_derived_version", None) == version:
+            return
+
+        # Calculate body, lower wick and upper wick lengths in a single fused pass
+        # over the raw arrays instead of three chained pandas operations
+        body, lwick, uwick = _derive(self.open, self.price, self.high, self.low)
+        self.data["Body"] = body
+        self.data["L-Wick"] = lwick
+        self.data["U-Wick"] = uwick
+        # Calculate quantile data of body length with online two-heap quantiles,
+        # kept as raw arrays since only the predicates consume them
+        self._q5_a = _expanding_quantile(body, 0.05)
+        self._q25_a = _expanding_quantile(body, 0.25)
+        self._q50_a = _expanding_quantile(body, 0.50)
         # Calculate local minimum over (asymmetrical) window size
         #window_size = 7
         #self.data["Min"] = (self.data["Price"] == self.data["Price"].rolling(window=window_size, center=True).min())
         # We can only detect a local minimum look_forward days after it has happened
+        # The flags are kept as flat uint8 arrays;
+        # only the predicate builder consumes them
         look_back, look_forward = 3, 1
-        self.data["Min"] = (self.data["Price"] == asym_rolling_minmax(self.data, look_back, look_forward, True))
-        self.data["Max"] = (self.data["Price"] == asym_rolling_minmax(self.data, look_back, look_forward, False))
+        self._min_a, self._max_a = _rolling_extrema(self.price, look_back, look_forward)
         # Add columns that describe the patterns and trends
         self.data["Pattern"] = ""
         self.data["Trend"] = ""
 
+        self._body_a = body
+        self._lwick_a = lwick
+        self._uwick_a = uwick
+        # Materialise the primitive predicates every pattern is built from
+        self._build_predicates()
+        # Scratch buffers reused by every detector,
+        # so a pattern sweep allocates nothing per pattern
+        self._word_buf = np.empty(self.n, dtype=np.uint64)
+        self._mask_buf = np.empty(self.n, dtype=np.bool_)
+        if cp is not None:
+            # Score every pattern on the device in one pass up front;
+            # the detectors then only read their bit out of the hit word
+            masks = cp.asarray(np.fromiter(PATTERN_MASKS.values(),
+                                           dtype=np.uint64,
+                                           count=len(PATTERN_MASKS)))
+            hits = _score_patterns(cp.asarray(self._packed), masks,
+                                   np.int32(len(PATTERN_MASKS)))
+            self._hits = cp.asnumpy(hits)
+        self._derived_version = version
+
+    def analyse_pattern(self) -> pd.DataFrame:
+        """
+        Derive the pattern predicates and search for the requested pattern
+        """
+
+        self._ensure_derived()
+
         if self.pattern == "all":
-            all = pd.concat([self.hammer(), self.inv_hammer(), self.bull_engulf(), self.piercing(),
-                             self.morning(), self.soldiers(), self.hanging(), self.shooting(),
-                             self.bear_engulf(), self.evening(), self.crows(), self.cloud(),
-                             self.doji(), self.spinning(), self.falling(), self.rising()])
+            all = pd.concat([method(self) for _, method in PATTERN_METHODS.values()])
             all.sort_index(inplace=True)
             print(all)
-        elif self.pattern == "hammer":
-            print("Searching for bullish hammer pattern")
-            self.hammer()
-        elif self.pattern == "inv_hammer":
-            print("Searching for bullish inverse hammer pattern")
-            self.inv_hammer()
-        elif self.pattern == "bull_engulf":
-            print("Searching for bullish engulfing pattern")
-            self.bull_engulf()
-        elif self.pattern == "piercing":
-            print("Searching for bullish piercing line pattern")
-            self.piercing()
-        elif self.pattern == "morning":
-            print("Searching for bullish morning star pattern")
-            self.morning()
-        elif self.pattern == "soldiers":
-            print("Searching for bullish three white soldier pattern")
-            self.soldiers()
-        elif self.pattern == "hanging":
-            print("Searching for bearish hanging man pattern")
-            self.hanging()
-        elif self.pattern == "shooting":
-            print("Searching for bearish shooting star pattern")
-            self.shooting()
-        elif self.pattern == "bear_engulf":
-            print("Searching for bearish engulfing pattern")
-            self.bear_engulf()
-        elif self.pattern == "evening":
-            print("Searching for bearish evening star pattern")
-            self.evening()
-        elif self.pattern == "crows":
-            print("Searching for bearish three black crows pattern")
-            self.crows()
-        elif self.pattern == "cloud":
-            print("Searching for bearish dark cloud cover pattern")
-            self.cloud()
-        elif self.pattern == "doji":
-            print("Searching for continuation doji pattern")
-            self.doji()
-        elif self.pattern == "spinning":
-            print("Searching for continuation spinning top pattern")
-            self.spinning()
-        elif self.pattern == "falling":
-            print("Searching for continuation falling three method pattern")
-            self.falling()
-        elif self.pattern == "rising":
-            print("Searching for continuation rising three method pattern")
-            self.rising()
         else:
-            print("Error: Pattern not recognised")
-        
+            try:
+                description, method = PATTERN_METHODS[self.pattern]
+            except KeyError:
+                print("Error: Pattern not recognised")
+            else:
+                print("Searching for {} pattern".format(description))
+                method(self)
+
         return self.data
 
+    def _build_predicates(self) -> None:
+        """
+        Materialise the primitive predicates shared by the pattern detectors
+        as contiguous uint8 arrays, computed once per dataset.
+        Conditions relating a candle to an earlier one are stored at the
+        index of the later candle, padded with zeros at the start,
+        so every pattern reduces to bitwise ANDs of these arrays
+        at offsets 0, 1, 2 (and 3, 4 for the three-method patterns).
+        """
+
+        n = self.n
+        o, p = self.open, self.price
+        hi, lo = self.high, self.low
+        body, lwick, uwick = self._body_a, self._lwick_a, self._uwick_a
+        q5, q25, q50 = self._q5_a, self._q25_a, self._q50_a
+
+        # Hoist the rescaled body arrays shared by several predicates,
+        # so each multiply happens once rather than per comparison
+        body_150 = 1.5*body
+        body_25 = 0.25*body
+        body_20 = 0.2*body
+        body_half = 0.5*body
+
+        pred = {}
+        # Candle colour
+        pred["is_green"] = (p > o).view(np.uint8)
+        pred["is_red"] = (o > p).view(np.uint8)
+        # Wick lengths relative to the body
+        pred["long_lwick"] = (body_150 <= lwick).view(np.uint8)
+        pred["long_uwick"] = (body_150 <= uwick).view(np.uint8)
+        pred["short_lwick"] = (body_25 >= lwick).view(np.uint8)
+        pred["short_uwick"] = (body_25 >= uwick).view(np.uint8)
+        pred["tiny_lwick"] = (body_20 >= lwick).view(np.uint8)
+        pred["tiny_uwick"] = (body_20 >= uwick).view(np.uint8)
+        # Wicks with approximately equal length (less than 20% difference)
+        # numexpr fuses the subtraction, abs and compare into one
+        # multi-threaded scan with no intermediate arrays;
+        # the threshold is pre-scaled so the maths stays in float32
+        uwick_20 = 0.2*uwick
+        pred["equal_wicks"] = ne.evaluate("abs(uwick - lwick) < uwick_20").view(np.uint8)
+        # Body length relative to the expanding quantiles
+        pred["short_body"] = (body <= q25).view(np.uint8)
+        pred["long_body"] = (body >= q50).view(np.uint8)
+        pred["tiny_body"] = (body < q5).view(np.uint8)
+        pred["sub25_body"] = (body < q25).view(np.uint8)
+        # Local extrema
+        pred["minimum"] = self._min_a
+        pred["maximum"] = self._max_a
+
+        # Cross-candle predicates, aligned to the index of the later candle
+        for name in ("close_up", "open_up", "prev_short50", "prev_long50",
+                     "prev_short25", "engulf_bull", "engulf_bear", "gap_down",
+                     "above_mid", "below_mid", "red_open_above"):
+            pred[name] = np.zeros(n, dtype=np.uint8)
+        # Aligned views of the current and previous candle
+        o0, o1 = o[:-1], o[1:]
+        p0, p1 = p[:-1], p[1:]
+        lo0, lo1 = lo[:-1], lo[1:]
+        hi0, hi1 = hi[:-1], hi[1:]
+        half0 = body_half[:-1]
+        # Candle opens and closes higher than the previous one
+        pred["close_up"][1:] = p1 > p0
+        pred["open_up"][1:] = o1 > o0
+        # Previous body length relative to the current expanding quantiles
+        pred["prev_short50"][1:] = body[:-1] <= q50[1:]
+        pred["prev_long50"][1:] = body[:-1] >= q50[1:]
+        pred["prev_short25"][1:] = body[:-1] <= q25[1:]
+        # Previous candle body/range is engulfed by the current candle,
+        # fused by numexpr into single scans
+        pred["engulf_bull"][1:] = ne.evaluate("(o1 < p0) & (p1 > o0)")
+        pred["engulf_bear"][1:] = ne.evaluate("(lo1 < lo0) & (hi1 > hi0)")
+        # Significant gap down between previous price and current opening
+        q25_1 = q25[1:]
+        pred["gap_down"][1:] = ne.evaluate("p0 - o1 >= q25_1")
+        # Current price relative to the midpoint of the previous body
+        pred["above_mid"][1:] = ne.evaluate("p1 >= p0 + half0")
+        pred["below_mid"][1:] = ne.evaluate("p1 < o0 + half0")
+        # Current candle opens above the previous price
+        pred["red_open_above"][1:] = o1 > p0
+
+        # Two candles back, for the star patterns
+        pred["prev2_long50"] = np.zeros(n, dtype=np.uint8)
+        pred["prev2_long50"][2:] = body[:-2] >= q50[2:]
+
+        # Four candles back, for the three-method patterns
+        for name in ("contain_low", "contain_high", "trend_down", "trend_up"):
+            pred[name] = np.zeros(n, dtype=np.uint8)
+        pred["contain_low"][4:] = np.minimum(lo[4:], lo[:-4]) < lo[1:-3]
+        pred["contain_high"][4:] = np.maximum(hi[4:], hi[:-4]) > hi[3:-1]
+        pred["trend_down"][4:] = p[:-4] > p[4:]
+        pred["trend_up"][4:] = p[4:] > p[:-4]
+
+        self._pred = pred
+
+        # Pack the predicates into one uint64 word per row;
+        # the shifted lanes are zero-padded at the front so the early rows
+        # can never satisfy a multi-candle mask
+        packed = np.zeros(n, dtype=np.uint64)
+        for (name, offset), bit in _pred_bits.items():
+            lane = pred[name].astype(np.uint64) << np.uint64(bit)
+            if offset == 0:
+                packed |= lane
+            elif offset < n:
+                # OR the lane in at the index of the later candle through
+                # aligned views, avoiding a concatenate copy per lane
+                packed[offset:] |= lane[:n-offset]
+        self._packed = packed
+
+    def _detect(self, pattern: str) -> np.ndarray:
+        """
+        Return the integer positions of the rows matching a pattern,
+        found in a single scan of the packed predicate word
+        """
+
+        self._ensure_derived()
+        if cp is not None:
+            hit_bit = np.uint16(1 << _pattern_slots[pattern])
+            return np.flatnonzero(self._hits & hit_bit)
+        mask_val = PATTERN_MASKS[pattern]
+        np.bitwise_and(self._packed, mask_val, out=self._word_buf)
+        np.equal(self._word_buf, mask_val, out=self._mask_buf)
+
+        return np.flatnonzero(self._mask_buf)
+
     def hammer(self) -> pd.DataFrame:
         """
         The hammer candlestick pattern is formed of a short body with a long lower wick,
@@ -169,17 +567,10 @@ class Identify:
         but green hammers indicate a stronger bull market than red hammers.
         """
 
-        # Lower wick >= 150% of body
-        mask_long_wick = (1.5*self.data["Body"] <= self.data["L-Wick"])
-        # Body within the 25th percentile
-        mask_short_body = (self.data["Body"] <= self.data["25 Body"])
-        # Local minimum
-        mask_minimum = (self.data["Min"] == True)
-        
-        mask = mask_long_wick & mask_short_body & mask_minimum
-        filtered_data = self.data.loc[mask].copy()
-        self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "hammer"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "up"
+        idx = self._detect("hammer")
+        filtered_data = self.data.take(idx)
+        self.data.loc[idx, "Pattern"] = filtered_data["Pattern"] = "hammer"
+        self.data.loc[idx, "Trend"] = filtered_data["Trend"] = "up"
 
         if filtered_data.empty:
             print("No hammer pattern detected from", self.start_date, "to", self.end_date)
@@ -200,17 +591,10 @@ class Identify:
         The inverse hammer suggests that buyers will soon have control of the market.
         """
 
-        # Lower wick <= 25% of body
-        mask_short_wick = (0.25*self.data["Body"] >= self.data["L-Wick"])
-        # Upper wick >= 150% of body
-        mask_long_wick = (1.5*self.data["Body"] <= self.data["U-Wick"])
-        # Local minimum
-        mask_minimum = (self.data["Min"] == True)
-
-        mask = mask_short_wick & mask_long_wick & mask_minimum
-        filtered_data = self.data.loc[mask].copy()
-        self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "inv_hammer"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "up"
+        idx = self._detect("inv_hammer")
+        filtered_data = self.data.take(idx)
+        self.data.loc[idx, "Pattern"] = filtered_data["Pattern"] = "inv_hammer"
+        self.data.loc[idx, "Trend"] = filtered_data["Trend"] = "up"
 
         if filtered_data.empty:
             print("No inverse hammer pattern detected from", self.start_date, "to", self.end_date)
@@ -230,19 +614,10 @@ class Identify:
         culminating in an obvious win for buyers.
         """
 
-        # Second candle has a green body
-        mask_second_red = (self.data["Price"] > self.data["Open"])
-        # First candle has a red body
-        mask_first_green = (self.data["Open"].shift(1) > self.data["Price"].shift(1))
-        # First candle has a short body (body within the 50th percentile)
-        mask_first_short = (self.data["Body"].shift(1) <= self.data["50 Body"])
-        # First candle is engulfed by the second candle
-        mask_engulf = (self.data["Open"] < self.data["Price"].shift(1)) & (self.data["Price"] > self.data["Open"].shift(1))
-
-        mask = mask_second_red & mask_first_green & mask_first_short & mask_engulf
-        filtered_data = self.data.loc[mask].copy()
-        self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "bull_engulf"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "up"
+        idx = self._detect("bull_engulf")
+        filtered_data = self.data.take(idx)
+        self.data.loc[idx, "Pattern"] = filtered_data["Pattern"] = "bull_engulf"
+        self.data.loc[idx, "Trend"] = filtered_data["Trend"] = "up"
 
         if filtered_data.empty:
             print("No bullish engulfing pattern detected from", self.start_date, "to", self.end_date)
@@ -263,22 +638,10 @@ class Identify:
         as the price is pushed up to or above the mid-price of the previous day.
         """
 
-        # Second candle has a green body
-        mask_second_green = (self.data["Price"] > self.data["Open"])
-        # First candle has a red body
-        mask_first_red = (self.data["Open"].shift(1) > self.data["Price"].shift(1))
-        # Both candles have long bodies (body greater than the 50th percentile)
-        mask_first_long = (self.data["Body"].shift(1) >= self.data["50 Body"])
-        mask_second_long = (self.data["Body"] >= self.data["50 Body"])
-        # Significant gap down between first candle price and second candle opening
-        mask_gap_down = (self.data["Price"].shift(1) - self.data["Open"] >= self.data["25 Body"])
-        # Price on second bar must be must be more than halfway up the body of the first bar
-        mask_body = (self.data["Price"] >= self.data["Price"].shift(1) + self.data["Body"].shift(1)/2)
-
-        mask = mask_first_red & mask_second_green & mask_first_long & mask_second_long & mask_gap_down & mask_body
-        filtered_data = self.data.loc[mask].copy()
-        self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "piercing"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "up"
+        idx = self._detect("piercing")
+        filtered_data = self.data.take(idx)
+        self.data.loc[idx, "Pattern"] = filtered_data["Pattern"] = "piercing"
+        self.data.loc[idx, "Trend"] = filtered_data["Trend"] = "up"
 
         if filtered_data.empty:
             print("No piercing line pattern detected from", self.start_date, "to", self.end_date)
@@ -299,20 +662,10 @@ class Identify:
         and a bull market is on the horizon.
         """
 
-        # Third candle has a green body
-        mask_third_green = (self.data["Price"] > self.data["Open"])
-        # First candle has a red body
-        mask_first_red = (self.data["Open"].shift(2) > self.data["Price"].shift(2))
-        # First and third candles have long bodies (body greater than the 50th percentile)
-        mask_first_long = (self.data["Body"].shift(2) >= self.data["50 Body"])
-        mask_third_long = (self.data["Body"] >= self.data["50 Body"])
-        # Second candle has a short body (less than the 25th percentile)
-        mask_second_short = (self.data["Body"].shift(1) <= self.data["25 Body"])
-
-        mask = mask_third_green & mask_first_red & mask_first_long & mask_third_long & mask_second_short
-        filtered_data = self.data.loc[mask].copy()
-        self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "morning"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "up"
+        idx = self._detect("morning")
+        filtered_data = self.data.take(idx)
+        self.data.loc[idx, "Pattern"] = filtered_data["Pattern"] = "morning"
+        self.data.loc[idx, "Trend"] = filtered_data["Trend"] = "up"
 
         if filtered_data.empty:
             print("No morning star pattern detected from", self.start_date, "to", self.end_date)
@@ -332,19 +685,10 @@ class Identify:
         and shows a steady advance of buying pressure.
         """
 
-        # All three bodies are green
-        mask_green = (self.data["Price"] > self.data["Open"]) & (self.data["Price"].shift(1) > self.data["Open"].shift(1)) & (self.data["Price"].shift(2) > self.data["Open"].shift(2))
-        # All three candles have small wicks (less than 25% of the body)
-        mask_upper_wicks = (0.25*self.data["Body"] >= self.data["U-Wick"]) & (0.25*self.data["Body"].shift(1) >= self.data["U-Wick"].shift(1)) & (0.25*self.data["Body"].shift(2) >= self.data["U-Wick"].shift(2))
-        mask_lower_wicks = (0.25*self.data["Body"] >= self.data["L-Wick"]) & (0.25*self.data["Body"].shift(1) >= self.data["L-Wick"].shift(1)) & (0.25*self.data["Body"].shift(2) >= self.data["L-Wick"].shift(2))
-        # Successive candles open and close progressively higher
-        mask_close = (self.data["Price"] > self.data["Price"].shift(1)) & (self.data["Price"].shift(1) > self.data["Price"].shift(2))
-        mask_open = (self.data["Open"] > self.data["Open"].shift(1)) & (self.data["Open"].shift(1) > self.data["Open"].shift(2))
-
-        mask = mask_green & mask_lower_wicks & mask_upper_wicks & mask_close & mask_open
-        filtered_data = self.data.loc[mask].copy()
-        self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "soldiers"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "up"
+        idx = self._detect("soldiers")
+        filtered_data = self.data.take(idx)
+        self.data.loc[idx, "Pattern"] = filtered_data["Pattern"] = "soldiers"
+        self.data.loc[idx, "Trend"] = filtered_data["Trend"] = "up"
 
         if filtered_data.empty:
             print("No three white soldier pattern detected from", self.start_date, "to", self.end_date)
@@ -364,17 +708,10 @@ class Identify:
         The large sell-off is often seen as an indication that the bulls are losing control of the market.
         """
 
-        # Lower wick >= 150% of body
-        mask_long_wick = (1.5*self.data["Body"] <= self.data["L-Wick"])
-        # Body within the 25th percentile
-        mask_short_body = (self.data["Body"] <= self.data["25 Body"])
-        # Local maximum
-        mask_maximum = (self.data["Max"] == True)
-
-        mask = mask_long_wick & mask_short_body & mask_maximum
-        filtered_data = self.data.loc[mask].copy()
-        self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "hanging"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "down"
+        idx = self._detect("hanging")
+        filtered_data = self.data.take(idx)
+        self.data.loc[idx, "Pattern"] = filtered_data["Pattern"] = "hanging"
+        self.data.loc[idx, "Trend"] = filtered_data["Trend"] = "down"
 
         if filtered_data.empty:
             print("No hanging man pattern detected from", self.start_date, "to", self.end_date)
@@ -394,19 +731,10 @@ class Identify:
         like a star falling to the ground.
         """
 
-        # Lower wick <= 25% of body
-        mask_short_wick = (0.25*self.data["Body"] >= self.data["L-Wick"])
-        # Upper wick >= 150% of body
-        mask_long_wick = (1.5*self.data["Body"] <= self.data["U-Wick"])
-        # Local maximum
-        mask_maximum = (self.data["Max"] == True)
-        # Candle has a red body
-        mask_green = (self.data["Open"] > self.data["Price"])
-
-        mask = mask_short_wick & mask_long_wick & mask_maximum & mask_green
-        filtered_data = self.data.loc[mask].copy()
-        self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "shooting"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "down"
+        idx = self._detect("shooting")
+        filtered_data = self.data.take(idx)
+        self.data.loc[idx, "Pattern"] = filtered_data["Pattern"] = "shooting"
+        self.data.loc[idx, "Trend"] = filtered_data["Trend"] = "down"
 
         if filtered_data.empty:
             print("No shooting star pattern detected from", self.start_date, "to", self.end_date)
@@ -427,20 +755,10 @@ class Identify:
         the more significant the trend is likely to be.
         """
 
-        # Second candle has a red body
-        mask_second_red = (self.data["Price"] < self.data["Open"])
-        # First candle has a green body
-        mask_first_green = (self.data["Price"].shift(1) > self.data["Open"].shift(1))
-        # First and second candles have short and long bodies (less than or greater than the 50th percentile)
-        mask_first_short = (self.data["Body"].shift(1) <= self.data["50 Body"])
-        mask_second_long = (self.data["Body"] >= self.data["50 Body"])
-        # First candle is engulfed by the second candle
-        mask_engulf = (self.data["Low"] < self.data["Low"].shift(1)) & (self.data["High"] > self.data["High"].shift(1))
-
-        mask = mask_first_green & mask_second_red & mask_first_short & mask_second_long & mask_engulf
-        filtered_data = self.data.loc[mask].copy()
-        self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "bear_engulf"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "down"
+        idx = self._detect("bear_engulf")
+        filtered_data = self.data.take(idx)
+        self.data.loc[idx, "Pattern"] = filtered_data["Pattern"] = "bear_engulf"
+        self.data.loc[idx, "Trend"] = filtered_data["Trend"] = "down"
 
         if filtered_data.empty:
             print("No bearish engulfing pattern detected from", self.start_date, "to", self.end_date)
@@ -459,20 +777,10 @@ class Identify:
         and is particularly strong when the third candlestick erases the gains of the first candle.
         """
 
-        # Third candle has a red body
-        mask_third_red = (self.data["Open"] > self.data["Price"])
-        # First candle has a green body
-        mask_first_green = (self.data["Price"].shift(2) > self.data["Open"].shift(2))
-        # First and third candles have long bodies (body greater than the 50th percentile)
-        mask_first_long = (self.data["Body"].shift(2) >= self.data["50 Body"])
-        mask_third_long = (self.data["Body"] >= self.data["50 Body"])
-        # Second candle has a short body (less than the 25th percentile)
-        mask_second_short = (self.data["Body"].shift(1) <= self.data["25 Body"])
-
-        mask = mask_first_green & mask_third_red & mask_first_long & mask_third_long & mask_second_short
-        filtered_data = self.data.loc[mask].copy()
-        self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "evening"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "down"
+        idx = self._detect("evening")
+        filtered_data = self.data.take(idx)
+        self.data.loc[idx, "Pattern"] = filtered_data["Pattern"] = "evening"
+        self.data.loc[idx, "Trend"] = filtered_data["Trend"] = "down"
 
         if filtered_data.empty:
             print("No evening star pattern detected from", self.start_date, "to", self.end_date)
@@ -492,19 +800,10 @@ class Identify:
         as the sellers have overtaken the buyers during three successive trading days.
         """
 
-        # All three candles have a red body
-        mask_first_red = (self.data["Open"].shift(2) > self.data["Price"].shift(2))
-        mask_second_red = (self.data["Open"].shift(1) > self.data["Price"].shift(1))
-        mask_third_red = (self.data["Open"] > self.data["Price"])
-        # All three with very small wicks
-        mask_first_wicks = (0.2*self.data["Body"].shift(2) >= self.data["L-Wick"].shift(2)) & (0.2*self.data["Body"].shift(2) >= self.data["U-Wick"].shift(2))
-        mask_second_wicks = (0.2*self.data["Body"].shift(1) >= self.data["L-Wick"].shift(1)) & (0.2*self.data["Body"].shift(1) >= self.data["U-Wick"].shift(1))
-        mask_third_wicks = (0.2*self.data["Body"] >= self.data["L-Wick"]) & (0.2*self.data["Body"] >= self.data["U-Wick"])
-
-        mask = mask_first_red & mask_second_red & mask_third_red & mask_first_wicks & mask_second_wicks & mask_third_wicks
-        filtered_data = self.data.loc[mask].copy()
-        self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "crows"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "down"
+        idx = self._detect("crows")
+        filtered_data = self.data.take(idx)
+        self.data.loc[idx, "Pattern"] = filtered_data["Pattern"] = "crows"
+        self.data.loc[idx, "Trend"] = filtered_data["Trend"] = "down"
 
         if filtered_data.empty:
             print("No three black crows pattern detected from", self.start_date, "to", self.end_date)
@@ -525,19 +824,10 @@ class Identify:
         If the wicks of the candles are short it suggests that the downtrend was extremely decisive.
         """
 
-        # First candle has a green body
-        mask_first_green = (self.data["Price"].shift(1) > self.data["Open"].shift(1))
-        # Second candle has a red body
-        mask_second_red = (self.data["Open"] > self.data["Price"])
-        # Red candle opens above the previous green body
-        mask_red_open = (self.data["Open"] > self.data["Price"].shift(1))
-        # Red candle closes below the midpoint of the green body
-        mask_red_close = (self.data["Price"] < self.data["Open"].shift(1) + self.data["Body"].shift(1)/2)
-
-        mask = mask_first_green & mask_second_red & mask_red_open & mask_red_close
-        filtered_data = self.data.loc[mask].copy()
-        self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "cloud"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "down"
+        idx = self._detect("cloud")
+        filtered_data = self.data.take(idx)
+        self.data.loc[idx, "Pattern"] = filtered_data["Pattern"] = "cloud"
+        self.data.loc[idx, "Trend"] = filtered_data["Trend"] = "down"
 
         if filtered_data.empty:
             print("No dark cloud cover pattern detected from", self.start_date, "to", self.end_date)
@@ -558,14 +848,10 @@ class Identify:
         but it can be found in reversal patterns such as the bullish morning star and bearish evening star.
         """
 
-        # Very small bodies
-        mask_first_body = (self.data["Body"].shift(1) < self.data["5 Body"].shift(1))
-        mask_second_body = (self.data["Body"] < self.data["5 Body"])
-
-        mask = mask_first_body & mask_second_body
-        filtered_data = self.data.loc[mask].copy()
-        self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "doji"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "cont"
+        idx = self._detect("doji")
+        filtered_data = self.data.take(idx)
+        self.data.loc[idx, "Pattern"] = filtered_data["Pattern"] = "doji"
+        self.data.loc[idx, "Trend"] = filtered_data["Trend"] = "cont"
 
         if filtered_data.empty:
             print("No doji pattern detected from", self.start_date, "to", self.end_date)
@@ -588,17 +874,10 @@ class Identify:
         but they can be interpreted as a sign of things to come as it signifies that the current market pressure is losing control.
         """
 
-        # Short bodies
-        mask_first_body = (self.data["Body"].shift(1) < self.data["25 Body"].shift(1))
-        mask_second_body = (self.data["Body"] < self.data["25 Body"])
-        # Wicks with approximately equal length (less than 20% difference)
-        mask_first_wick = (abs(self.data["U-Wick"].shift(1) - self.data["L-Wick"].shift(1)) < 0.2*self.data["U-Wick"].shift(1))
-        mask_second_wick = (abs(self.data["U-Wick"] - self.data["L-Wick"]) < 0.2*self.data["U-Wick"])
-
-        mask = mask_first_body & mask_second_body & mask_first_wick & mask_second_wick
-        filtered_data = self.data.loc[mask].copy()
-        self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "spinning"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "cont"
+        idx = self._detect("spinning")
+        filtered_data = self.data.take(idx)
+        self.data.loc[idx, "Pattern"] = filtered_data["Pattern"] = "spinning"
+        self.data.loc[idx, "Trend"] = filtered_data["Trend"] = "cont"
 
         if filtered_data.empty:
             print("No spinning top pattern detected from", self.start_date, "to", self.end_date)
@@ -618,20 +897,10 @@ class Identify:
         It shows traders that the bulls do not have enough strength to reverse the trend.
         """
 
-        # First and last bodies are red
-        mask_red = (self.data["Open"].shift(4) > self.data["Price"].shift(4)) & (self.data["Open"] > self.data["Price"])
-        # Three bodies in the middle are all green
-        mask_green = (self.data["Price"].shift(3) > self.data["Open"].shift(3)) & (self.data["Price"].shift(2) > self.data["Open"].shift(2)) & (self.data["Price"].shift(1) > self.data["Open"].shift(1))
-        # Green candles contained within the range of the red bodies
-        mask_contain_first = (np.minimum(self.data["Low"], self.data["Low"].shift(4)) < self.data["Low"].shift(3))
-        mask_contain_third = (np.maximum(self.data["High"], self.data["High"].shift(4)) > self.data["High"].shift(1))
-        # There is a falling trend
-        mask_falling = (self.data["Price"].shift(4) > self.data["Price"])
-
-        mask = mask_red & mask_green & mask_contain_first & mask_contain_third & mask_falling
-        filtered_data = self.data.loc[mask].copy()
-        self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "falling"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "cont"
+        idx = self._detect("falling")
+        filtered_data = self.data.take(idx)
+        self.data.loc[idx, "Pattern"] = filtered_data["Pattern"] = "falling"
+        self.data.loc[idx, "Trend"] = filtered_data["Trend"] = "cont"
 
         if filtered_data.empty:
             print("No falling three method pattern detected from", self.start_date, "to", self.end_date)
@@ -648,20 +917,10 @@ class Identify:
         The pattern shows traders that, despite some selling pressure, buyers are retaining control of the market.
         """
 
-        # First and last bodies are green
-        mask_green = (self.data["Price"].shift(4) > self.data["Open"].shift(4)) & (self.data["Price"] > self.data["Open"])
-        # Three bodies in the middle are all red
-        mask_red = (self.data["Open"].shift(3) > self.data["Price"].shift(3)) & (self.data["Open"].shift(2) > self.data["Price"].shift(2)) & (self.data["Open"].shift(1) > self.data["Price"].shift(1))
-        # Red candles contained within the range of the green bodies
-        mask_contain_first = (np.minimum(self.data["Low"], self.data["Low"].shift(4)) < self.data["Low"].shift(3))
-        mask_contain_third = (np.maximum(self.data["High"], self.data["High"].shift(4)) > self.data["High"].shift(1))
-        # There is a rising trend
-        mask_falling = (self.data["Price"] > self.data["Price"].shift(4))
-
-        mask = mask_red & mask_green & mask_contain_first & mask_contain_third & mask_falling
-        filtered_data = self.data.loc[mask].copy()
-        self.data.loc[mask, "Pattern"] = filtered_data["Pattern"] = "rising"
-        self.data.loc[mask, "Trend"] = filtered_data["Trend"] = "cont"
+        idx = self._detect("rising")
+        filtered_data = self.data.take(idx)
+        self.data.loc[idx, "Pattern"] = filtered_data["Pattern"] = "rising"
+        self.data.loc[idx, "Trend"] = filtered_data["Trend"] = "cont"
 
         if filtered_data.empty:
             print("No rising three method pattern detected from", self.start_date, "to", self.end_date)
@@ -669,4 +928,21 @@ class Identify:
             print("Rising three method pattern detected at:")
             print(filtered_data)
         
-        return filtered_data
\ No newline at end of file
+        return filtered_data
+# Description and detector method for each pattern, used for dispatch
+PATTERN_METHODS = {"hammer": ("bullish hammer", Identify.hammer),
+                   "inv_hammer": ("bullish inverse hammer", Identify.inv_hammer),
+                   "bull_engulf": ("bullish engulfing", Identify.bull_engulf),
+                   "piercing": ("bullish piercing line", Identify.piercing),
+                   "morning": ("bullish morning star", Identify.morning),
+                   "soldiers": ("bullish three white soldier", Identify.soldiers),
+                   "hanging": ("bearish hanging man", Identify.hanging),
+                   "shooting": ("bearish shooting star", Identify.shooting),
+                   "bear_engulf": ("bearish engulfing", Identify.bear_engulf),
+                   "evening": ("bearish evening star", Identify.evening),
+                   "crows": ("bearish three black crows", Identify.crows),
+                   "cloud": ("bearish dark cloud cover", Identify.cloud),
+                   "doji": ("continuation doji", Identify.doji),
+                   "spinning": ("continuation spinning top", Identify.spinning),
+                   "falling": ("continuation falling three method", Identify.falling),
+                   "rising": ("continuation rising three method", Identify.rising)}
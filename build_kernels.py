@@ -0,0 +1,29 @@
+"""
+Ahead-of-time compile the jitted analysis kernels
+
+Numba's cache=True still recompiles whenever the Python or Numba version
+changes; building the kernels into a quant_kernels extension module makes
+start-up pure import cost. analysis.py picks the module up automatically
+when it exists:
+
+    python build_kernels.py
+"""
+
+# Import libraries
+from numba.pycc import CC
+
+# The _jit names always point at the jitted functions, even once a
+# previous build has replaced the public kernel names with AOT builtins
+from analysis import _derive_jit, _rolling_extrema_jit, _expanding_quantile_jit
+
+cc = CC("quant_kernels")
+
+cc.export("derive",
+          "Tuple((f4[:], f4[:], f4[:]))(f4[:], f4[:], f4[:], f4[:])")(_derive_jit.py_func)
+cc.export("rolling_extrema",
+          "Tuple((u1[:], u1[:]))(f4[:], i8, i8)")(_rolling_extrema_jit.py_func)
+cc.export("expanding_quantile",
+          "f4[:](f4[:], f8)")(_expanding_quantile_jit.py_func)
+
+if __name__ == "__main__":
+    cc.compile()
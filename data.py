@@ -89,8 +89,10 @@ def filter_data(data: pd.DataFrame,
 
     start_date = pd.to_datetime(start_date, format="%Y-%m-%d")
     end_date = pd.to_datetime(end_date, format="%Y-%m-%d")
-    mask = (data["Date"] >= start_date) & (data["Date"] <= end_date)
-    filtered_data = data.loc[mask]
+    # query hands the whole range check to numexpr in one fused pass,
+    # rather than materialising two boolean masks and ANDing them
+    filtered_data = data.query("@start_date <= Date <= @end_date",
+                               engine="numexpr")
 
     return filtered_data
 
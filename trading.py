@@ -4,6 +4,7 @@ Trading government bonds
 
 # Import libraries
 import pandas as pd
+import numpy as np
 
 class Strategy:
     """
@@ -43,15 +44,22 @@ class Strategy:
         funds = 0
         available = True
 
-        for i in self.data.index.tolist()[1:]:
-            if self.data.loc[i - 1, "Trend"] == "up" and available:
+        trend = self.data["Trend"].to_numpy()
+        open_a = self.data["Open"].to_numpy()
+        # Only rows following a detected pattern can trigger a trade,
+        # so evaluate that sparse condition first and walk just its hits
+        # instead of scanning every row with label lookups
+        signal_rows = np.flatnonzero(trend[:-1] != "") + 1
+
+        for i in signal_rows:
+            if trend[i - 1] == "up" and available:
                 # Buy bond
-                funds -= self.data.loc[i, "Open"]
+                funds -= open_a[i]
                 self.data.at[i, "Action"] = "buy"
                 available = False
-            elif self.data.loc[i - 1, "Trend"] == "down" and not available:
+            elif trend[i - 1] == "down" and not available:
                 # Sell bond
-                funds += self.data.loc[i, "Open"]
+                funds += open_a[i]
                 self.data.at[i, "Action"] = "sell"
                 available = True
         